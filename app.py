@@ -1,4 +1,7 @@
 
+import time
+_RUN_START = time.perf_counter()
+
 import streamlit as st
 
 # --- Page Config (Must be first) ---
@@ -9,13 +12,22 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-import pandas as pd
-from pdf_parser import PRExtractor
-from excel_handler import create_excel_with_tabs, flatten_json_to_rows
-import data_manager
-import time
 from datetime import datetime
-import google.generativeai as genai
+import os
+import shutil
+import tempfile
+
+# [성능 측정] 환경 변수 PO_PROFILE=1 또는 Secrets의 profile_timing = true 일 때만 로그 출력
+try:
+    PROFILE_TIMING = os.environ.get("PO_PROFILE") == "1" or bool(st.secrets.get("profile_timing", False))
+except:
+    PROFILE_TIMING = os.environ.get("PO_PROFILE") == "1"
+
+def log_timing(stage):
+    """[성능 측정] 스크립트 실행 시작부터 현재 단계까지 걸린 시간을 로그로 남깁니다."""
+    if not PROFILE_TIMING:
+        return
+    print(f"[Perf] {stage}: {(time.perf_counter() - _RUN_START) * 1000:.0f}ms")
 
 # --- CONFIGURATION (TEAM SETTINGS) ---
 # [팀 공유용 설정] 클라우드 배포 시 Streamlit Secrets에서 키를 가져옵니다.
@@ -74,16 +86,25 @@ def check_login():
     return False
 
 # 로그인이 안 되어 있으면 여기서 멈춤 (앱 내용 숨김)
+# 무거운 라이브러리(pandas, PDF/엑셀/구글 시트)는 로그인 이후에 불러옵니다.
 if not check_login():
+    log_timing("login screen")
     st.stop()
 
+import pandas as pd
+import data_manager
+from order_model import lines_to_frame
+log_timing("main imports")
+
 # ==========================================
 # 🎬 메인 앱 시작
 # ==========================================
 
 # [디버깅] 라이브러리 버전 확인
+# (라이브러리를 import하지 않고 설치 정보에서 버전만 읽음)
 try:
-    st.warning(f"🛠️ 현재 설치된 구글 라이브러리 버전: **{genai.__version__}** (권장: 0.8.0 이상)")
+    from importlib.metadata import version as package_version
+    st.warning(f"🛠️ 현재 설치된 구글 라이브러리 버전: **{package_version('google-generativeai')}** (권장: 0.8.0 이상)")
 except:
     st.error("구글 라이브러리 버전을 확인할 수 없습니다.")
 
@@ -232,7 +253,7 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("**🛡️ 데이터 저장소 상태**")
     try:
-        if data_manager.get_google_sheet_client():
+        if data_manager.get_storage_status() == "cloud":
              st.success("☁️ 구글 시트 연동됨 (안전)")
         else:
              st.warning("💾 로컬 저장소 사용 중")
@@ -264,44 +285,96 @@ with main_tab1:
     # Session State 초기화
     if 'current_processed_data' not in st.session_state:
         st.session_state.current_processed_data = []
+    if 'current_file_hashes' not in st.session_state:
+        st.session_state.current_file_hashes = {}
     
     uploaded_files = st.file_uploader("PDF 발주서를 업로드하세요", type=['pdf'], accept_multiple_files=True)
     
     if uploaded_files:
+        reanalyze_known = st.checkbox("이미 저장된 발주서 파일도 다시 분석", value=False)
+        use_packing = st.checkbox("한 페이지짜리 발주서는 여러 건을 묶어서 분석 (빠름)", value=True)
         if st.button("🚀 분석 시작", type="primary", use_container_width=True):
             st.session_state.current_processed_data = []
+            st.session_state.current_file_hashes = {}
+            # PDF 분석/엑셀 변환 모듈은 분석을 시작할 때만 불러옴
+            from pdf_parser import PRExtractor, REQUEST_INTERVAL
+            from excel_handler import flatten_json_to_rows
             extractor = PRExtractor(api_key)
             progress_bar = st.progress(0)
             status_text = st.empty()
             all_rows = []
             
-            for idx, file in enumerate(uploaded_files):
-                status_text.text(f"📸 이미지 스캔 및 분석 중: {file.name}...")
-                try:
-                    file.seek(0)
-                    file_bytes = file.read()
-                    parsed_json = extractor.parse_with_llm(file_bytes)
-                    
-                    if "error" in parsed_json:
-                        st.error(f"{file.name}: {parsed_json['error']}")
-                        continue
-                        
-                # [성공 피드백] 사용된 모델 표시 (원활한 탐색 결과 표시)
-                    used_model = parsed_json.pop('_used_model', 'Unknown Model')
-                    status_text.success(f"✅ 분석 완료: {file.name} (엔진: {used_model})")
-                    
-                    rows = flatten_json_to_rows(parsed_json, file.name)
-                    all_rows.extend(rows)
-                    
-                except Exception as e:
-                    st.error(f"오류 발생 ({file.name}): {e}")
-                    
-                progress_bar.progress((idx + 1) / len(uploaded_files))
-                
-                # [속도 복원] 지정 모델 연결로 속도 최적화
-                if idx < len(uploaded_files) - 1:
-                    status_text.text(f"⏳ 모델 연결 중: 5초 대기 (최적화 완료) ({idx+1}/{len(uploaded_files)})")
-                    time.sleep(5)
+            # 1단계: 중복 확인 및 임시 파일 준비 (모델 호출 없음)
+            targets = []  # (파일명, 임시 파일 경로)
+            try:
+                for file in uploaded_files:
+                    tmp_path = None
+                    try:
+                        # [중복 방지] 이미 저장된 파일이면 모델 호출 없이 건너뜀
+                        file_hash = data_manager.hash_uploaded_file(file)
+                        known_name = data_manager.find_known_file(file_hash)
+                        if known_name and not reanalyze_known:
+                            st.warning(f"⏭️ {file.name}: 이미 저장된 발주서입니다 (최초 저장 파일: {known_name}). 분석을 건너뜁니다.")
+                            continue
+                        st.session_state.current_file_hashes[file.name] = file_hash
+
+                        # [메모리 절약] 업로드 파일을 임시 파일로 옮긴 뒤 경로로 열기
+                        # (파일 전체를 bytes로 복사하지 않고, PDF는 필요한 페이지만 읽음)
+                        file.seek(0)
+                        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                            tmp_path = tmp.name
+                            shutil.copyfileobj(file, tmp, 1024 * 1024)
+                        targets.append((file.name, tmp_path))
+                    except Exception as e:
+                        st.error(f"오류 발생 ({file.name}): {e}")
+                        # 복사 도중 실패한 임시 파일은 분석 대상에서 빼고 바로 삭제
+                        if tmp_path:
+                            try:
+                                os.remove(tmp_path)
+                            except OSError:
+                                pass
+
+                # 2단계: 요청 단위 구성 (묶음 분석 시 짧은 발주서 여러 건을 한 번에 요청)
+                paths = [path for _, path in targets]
+                if use_packing:
+                    packs = extractor.make_packs(paths)
+                else:
+                    packs = [[i] for i in range(len(targets))]
+
+                done = 0
+                for pack_idx, pack in enumerate(packs):
+                    names = [targets[i][0] for i in pack]
+                    status_text.text(f"📸 이미지 스캔 및 분석 중: {', '.join(names)}...")
+                    try:
+                        results = extractor.parse_pack([paths[i] for i in pack])
+                    except Exception as e:
+                        results = [{"error": str(e)}] * len(pack)
+
+                    for name, parsed_json in zip(names, results):
+                        if "error" in parsed_json:
+                            st.error(f"{name}: {parsed_json['error']}")
+                            continue
+
+                        # [성공 피드백] 사용된 모델 표시 (원활한 탐색 결과 표시)
+                        used_model = parsed_json.pop('_used_model', 'Unknown Model')
+                        status_text.success(f"✅ 분석 완료: {name} (엔진: {used_model})")
+
+                        rows = flatten_json_to_rows(parsed_json, name)
+                        all_rows.extend(rows)
+
+                    done += len(pack)
+                    progress_bar.progress(done / len(targets))
+
+                    # [속도 복원] 지정 모델 연결로 속도 최적화 (요청 사이에만 대기)
+                    if pack_idx < len(packs) - 1:
+                        status_text.text(f"⏳ 모델 연결 중: {REQUEST_INTERVAL}초 대기 (최적화 완료) ({done}/{len(targets)})")
+                        time.sleep(REQUEST_INTERVAL)
+            finally:
+                for _, path in targets:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
             
             st.session_state.current_processed_data = all_rows
             status_text.success("✅ 분석 완료! 아래에서 데이터를 확인하고 저장하세요.")
@@ -312,7 +385,7 @@ with main_tab1:
         st.markdown("#### 📝 분석 결과 확인 및 수정")
         st.info("데이터를 수정한 후, 반드시 **[💾 데이터베이스에 저장]** 버튼을 눌러야 누적됩니다.")
         
-        df = pd.DataFrame(st.session_state.current_processed_data)
+        df = lines_to_frame(st.session_state.current_processed_data)
         if '일자' in df.columns:
             df['일자'] = pd.to_datetime(df['일자'], errors='coerce')
 
@@ -332,13 +405,30 @@ with main_tab1:
             }
         )
         
+        # [중복 방지] 이미 저장된 발주와 내용이 같은 행 확인
+        duplicate_mask = data_manager.find_duplicate_orders(edited_df)
+        include_duplicates = False
+        if duplicate_mask.any():
+            st.warning(f"⚠️ 이미 저장된 발주와 내용이 같은 행이 {int(duplicate_mask.sum())}건 있습니다. 기본적으로 저장에서 제외됩니다.")
+            include_duplicates = st.checkbox("중복 행도 함께 저장", value=False)
+
         col1, col2 = st.columns(2)
         with col1:
             if st.button("💾 데이터베이스에 저장 (누적)", type="secondary", use_container_width=True):
-                # 데이터베이스에 Append
-                data_manager.append_to_database(edited_df)
-                st.success(f"✅ {len(edited_df)}건의 데이터가 성공적으로 저장되었습니다!")
-                st.balloons()
+                to_save = edited_df if include_duplicates else edited_df[~duplicate_mask]
+                to_save = to_save.copy()
+                if to_save.empty:
+                    st.info("저장할 새 데이터가 없습니다.")
+                else:
+                    # 저장되는 행의 원본 파일 해시만 함께 기록
+                    saved_files = set(to_save['파일명']) if '파일명' in to_save.columns else set()
+                    file_hashes = {name: h for name, h in st.session_state.current_file_hashes.items() if name in saved_files}
+                    # 데이터베이스에 Append
+                    data_manager.append_to_database(to_save, file_hashes=file_hashes)
+                    # 이전에 만들어 둔 엑셀 파일은 새 데이터가 빠져 있으므로 폐기
+                    st.session_state.pop("export_file", None)
+                    st.success(f"✅ {len(to_save)}건의 데이터가 성공적으로 저장되었습니다!")
+                    st.balloons()
                 # 저장 후 세션 초기화 (옵션)
                 # st.session_state.current_processed_data = [] 
                 # st.rerun()
@@ -349,8 +439,8 @@ with main_tab1:
 with main_tab2:
     st.markdown("### 📊 기간별 발주 내역 조회")
     
-    # 상단 컨트롤 패널: 기간 선택
-    col_filter1, col_filter2, col_dummy = st.columns([1, 1, 2])
+    # 상단 컨트롤 패널: 기간 / 거래처 / 품목 선택
+    col_filter1, col_filter2, col_filter3, col_filter4 = st.columns([1, 1, 1, 1])
     
     with col_filter1:
         # 이번 달 1일 계산
@@ -359,15 +449,40 @@ with main_tab2:
         start_date = st.date_input("시작일", value=first_day)
     with col_filter2:
         end_date = st.date_input("종료일", value=today)
+    with col_filter3:
+        client_filter = st.text_input("거래처명 필터", placeholder="예: oo건설")
+    with col_filter4:
+        item_filter = st.text_input("품목명 필터", placeholder="예: 배관")
+
+    # 정렬 / 페이지 설정
+    col_sort1, col_sort2, col_page1, col_page2 = st.columns([1, 1, 1, 1])
+    with col_sort1:
+        sort_by = st.selectbox("정렬 기준", ['일자', '거래처명', '품목명(규격)', '수량', '등록일시'])
+    with col_sort2:
+        sort_order = st.selectbox("정렬 순서", ["내림차순", "오름차순"])
+    with col_page1:
+        page_size = st.selectbox("페이지당 건수", [50, 100, 200, 500], index=1)
+    with col_page2:
+        page = st.number_input("페이지", min_value=1, value=1, step=1)
         
-    # 데이터 로드
-    db_data = data_manager.get_filtered_data(start_date, end_date)
+    # 데이터 로드 (현재 페이지만)
+    page_data, total_count = data_manager.query_page(
+        start_date, end_date,
+        client=client_filter.strip(),
+        item=item_filter.strip(),
+        sort_by=sort_by,
+        ascending=(sort_order == "오름차순"),
+        page=page,
+        page_size=page_size
+    )
     
-    if not db_data.empty:
-        st.markdown(f"**검색 결과: 총 {len(db_data)}건**")
+    if total_count > 0:
+        last_page = (total_count - 1) // page_size + 1
+        current_page = min(page, last_page)
+        st.markdown(f"**검색 결과: 총 {total_count}건** (페이지 {current_page}/{last_page})")
         
-        # 엑셀 변환을 위해 날짜 포맷 정리, 컬럼 순서 정리
-        display_df = db_data.copy()
+        # 현재 페이지만 날짜 포맷 정리, 컬럼 순서 정리
+        display_df = page_data.copy()
         
         # 날짜 포맷팅 (보기 좋게)
         if '일자' in display_df.columns:
@@ -377,7 +492,8 @@ with main_tab2:
             
         # 컬럼 순서 재배치
         priority_cols = ['일자', '거래처명', '품목명(규격)', '수량', '수화주', '전화번호', '주소지', '비고']
-        other_cols = [c for c in display_df.columns if c not in priority_cols]
+        hidden_cols = ['파일해시']  # 중복 판별용 내부 컬럼
+        other_cols = [c for c in display_df.columns if c not in priority_cols + hidden_cols]
         final_cols = priority_cols + other_cols
         
         final_cols = [c for c in final_cols if c in display_df.columns]
@@ -392,25 +508,72 @@ with main_tab2:
         
         st.markdown("---")
         
-        # 엑셀 다운로드 버튼
-        # data_manager에서 불러온 DF를 excel_handler 형식(list of dict)으로 변환
-        excel_ready_data = db_data.to_dict('records')
-        excel_file = create_excel_with_tabs(excel_ready_data)
-        
+        # 엑셀 다운로드 (전체 기간 데이터는 요청 시에만 생성)
+        export_key = f"{start_date}_{end_date}"
         col_down1, col_down2 = st.columns([1, 3])
         with col_down1:
-            file_name_str = f"발주내역_누적_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.xlsx"
-            st.download_button(
-                label="📥 조회된 내역 엑셀 다운로드",
-                data=excel_file,
-                file_name=file_name_str,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                type="primary",
-                use_container_width=True
-            )
+            if st.button("📊 조회 기간 엑셀 파일 만들기", use_container_width=True):
+                with st.spinner("엑셀 파일 생성 중..."):
+                    from excel_handler import create_excel_with_tabs
+                    db_data = data_manager.get_filtered_data(start_date, end_date)
+                    # DataFrame을 그대로 전달 (list of dict 변환 생략)
+                    st.session_state.export_file = (export_key, create_excel_with_tabs(db_data))
+
+            export = st.session_state.get("export_file")
+            if export and export[0] == export_key:
+                file_name_str = f"발주내역_누적_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.xlsx"
+                st.download_button(
+                    label="📥 조회된 내역 엑셀 다운로드",
+                    data=export[1],
+                    file_name=file_name_str,
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    type="primary",
+                    use_container_width=True
+                )
             
     else:
-        st.info("🔍 해당 기간에 저장된 데이터가 없습니다.")
+        st.info("🔍 해당 조건에 맞는 저장된 데이터가 없습니다.")
+
+    # 통합 검색 (거래처명 / 수화주 / 품목명 / 주소지 / 비고)
+    st.markdown("---")
+    st.markdown("### 🔎 전체 기간 통합 검색")
+    col_search1, col_search2 = st.columns([3, 1])
+    with col_search1:
+        search_query = st.text_input("검색어", placeholder="거래처명, 수화주, 품목명, 주소지, 비고로 검색", label_visibility="collapsed")
+    with col_search2:
+        if st.button("🔄 검색/조회 인덱스 재생성", use_container_width=True):
+            indexed_count = data_manager.rebuild_indexes()
+            st.toast(f"{indexed_count}건으로 검색/중복/조회 인덱스를 다시 만들었습니다.", icon="✅")
+
+    if search_query.strip():
+        search_result, is_fuzzy = data_manager.search_orders(search_query)
+        if search_result.empty:
+            st.info("🔍 검색 결과가 없습니다.")
+        else:
+            if is_fuzzy:
+                st.caption("정확히 일치하는 결과가 없어 비슷한 항목을 보여줍니다.")
+            st.markdown(f"**검색 결과: {len(search_result)}건** (최대 200건 표시)")
+            st.dataframe(search_result, use_container_width=True, hide_index=True)
+
+    # 누적 집계 (저장 시 갱신되는 집계 테이블에서 바로 조회)
+    st.markdown("<br>", unsafe_allow_html=True)
+    with st.expander("📈 전체 누적 집계 (월별 / 거래처별 / 품목별)"):
+        rollup_tab1, rollup_tab2, rollup_tab3, rollup_tab4 = st.tabs(["월별", "일별", "거래처별", "품목별"])
+        with rollup_tab1:
+            st.dataframe(data_manager.get_rollup("month"), use_container_width=True, hide_index=True)
+        with rollup_tab2:
+            st.dataframe(data_manager.get_rollup("day"), use_container_width=True, hide_index=True)
+        with rollup_tab3:
+            st.dataframe(data_manager.get_rollup("client"), use_container_width=True, hide_index=True)
+        with rollup_tab4:
+            st.dataframe(data_manager.get_rollup("item"), use_container_width=True, hide_index=True)
+
+        if st.button("🔄 집계 다시 계산 (정합성 점검)"):
+            _, mismatches = data_manager.rebuild_rollups()
+            if mismatches:
+                st.warning(f"집계를 다시 계산했습니다. 불일치 항목 {mismatches}건이 수정되었습니다.")
+            else:
+                st.success("집계가 원본 데이터와 일치합니다.")
         
     # Danger Zone
     st.markdown("<br><br><br>", unsafe_allow_html=True)
@@ -421,3 +584,5 @@ with main_tab2:
             st.error("모든 데이터가 삭제되었습니다.")
             time.sleep(1)
             st.rerun()
+
+log_timing("rerun complete")
@@ -0,0 +1,114 @@
+"""
+PDF 페이지 변환 메모리 벤치마크
+
+여러 페이지짜리 PDF를 만들어 PRExtractor.render_pages로 변환하고,
+앱과 같이 업로드 파일을 임시 파일로 옮긴 뒤 parse_with_llm 경로(모델 호출 제외)로도 분석하여
+변환 시작 전보다 늘어난 프로세스 최대 메모리(peak RSS)가 예산을 넘지 않는지 확인합니다.
+(라이브러리 import 등 변환과 무관한 메모리는 환경마다 달라 제외)
+
+기본 예산은 40페이지 기준 측정값(약 25MB 증가)에 여유를 더한 값입니다.
+
+사용법:
+    python bench_memory.py                      # 기본: 40페이지, 예산 40MB
+    python bench_memory.py --pages 80 --budget-mb 60
+"""
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from pdf_parser import PRExtractor
+
+
+def peak_rss_mb():
+    """현재까지의 프로세스 최대 메모리 (MB). Linux는 KB, macOS는 바이트 단위로 반환됨."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class OfflineExtractor(PRExtractor):
+    """
+    모델을 호출하지 않는 PRExtractor. parse_with_llm의 변환/입력 구성 경로만 측정합니다.
+    """
+    def __init__(self):
+        self.image_count = 0
+
+    def _generate_json(self, inputs):
+        self.image_count = sum(1 for part in inputs if isinstance(part, dict))
+        return {"client_name": "benchmark", "items": []}, "offline", None, False
+
+
+def make_sample_pdf(path, pages):
+    """
+    스캔 발주서와 비슷하게 글자와 표 선이 빽빽한 A4 페이지들로 PDF를 만듭니다.
+    """
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4 (pt)
+        page.insert_text((40, 50), f"PURCHASE ORDER - page {page_no + 1}", fontsize=18)
+        for row in range(60):
+            y = 80 + row * 12
+            page.draw_line((40, y + 2), (555, y + 2), color=(0.6, 0.6, 0.6), width=0.5)
+            page.insert_text((45, y), f"{row + 1:03d}  ITEM-{page_no:03d}-{row:03d}  SPEC 50A  QTY {row * 7 % 97}", fontsize=8)
+        # 스캔 잡음을 흉내 내기 위한 도형
+        for i in range(40):
+            page.draw_circle((60 + i * 12, 800), 4, color=(0.3, 0.3, 0.3), fill=(0.8, 0.8, 0.8))
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 페이지 변환 메모리 벤치마크")
+    parser.add_argument("--pages", type=int, default=40, help="생성할 PDF 페이지 수")
+    parser.add_argument("--budget-mb", type=float, default=40, help="변환 시작 전 대비 허용할 최대 메모리 증가량 (MB)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "sample.pdf")
+        make_sample_pdf(pdf_path, args.pages)
+
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        pages = PRExtractor.render_pages(pdf_path)
+        elapsed = time.perf_counter() - started
+        peak = peak_rss_mb()
+        png_mb = sum(len(p) for p in pages) / (1024 * 1024)
+        page_total = len(pages)
+        pages = None
+
+        # 앱과 같은 경로: 업로드 파일 -> 임시 파일 복사 -> 경로로 parse_with_llm
+        extractor = OfflineExtractor()
+        started = time.perf_counter()
+        with open(pdf_path, "rb") as upload:
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False, dir=tmp_dir) as tmp:
+                shutil.copyfileobj(upload, tmp, 1024 * 1024)
+        try:
+            result = extractor.parse_with_llm(tmp.name)
+        finally:
+            os.remove(tmp.name)
+        parse_elapsed = time.perf_counter() - started
+        parse_peak = peak_rss_mb()
+
+    print(f"페이지 수: {page_total}")
+    print(f"PNG 합계: {png_mb:.1f}MB")
+    print(f"변환 시간: {elapsed:.2f}s")
+    print(f"임시 파일 분석 시간 (모델 호출 제외): {parse_elapsed:.2f}s")
+    print(f"최대 메모리: 시작 전 {baseline:.1f}MB -> 변환 후 {peak:.1f}MB -> 분석 후 {parse_peak:.1f}MB")
+    print(f"메모리 증가량: {parse_peak - baseline:.1f}MB (예산 {args.budget_mb:.0f}MB)")
+
+    assert page_total == args.pages, f"변환된 페이지 수가 다릅니다: {page_total} != {args.pages}"
+    assert "error" not in result, f"분석 경로 실패: {result.get('error')}"
+    assert extractor.image_count == args.pages, f"모델 입력 이미지 수가 다릅니다: {extractor.image_count} != {args.pages}"
+    assert parse_peak - baseline <= args.budget_mb, f"메모리 예산 초과: {parse_peak - baseline:.1f}MB > {args.budget_mb:.0f}MB"
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
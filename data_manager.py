@@ -1,23 +1,59 @@
 import pandas as pd
 import os
+import math
+import sqlite3
 from datetime import datetime
+import importlib.util
 import streamlit as st
-try:
-    import gspread
-    from oauth2client.service_account import ServiceAccountCredentials
-    HAS_GSHEETS_LIB = True
-except ImportError:
-    HAS_GSHEETS_LIB = False
+import search_index
+import order_store
+import duplicate_index
+
+# gspread / oauth2client는 실제 인증 시점에만 불러옵니다. (앱 시작 속도 개선)
+HAS_GSHEETS_LIB = (
+    importlib.util.find_spec("gspread") is not None
+    and importlib.util.find_spec("oauth2client") is not None
+)
 
 # 데이터베이스 파일 경로 (로컬 백업/Fallback용)
 DB_FILE = "po_database.csv"
 
-# 구글 시트 설정 (Secrets에서 가져오기)
-# st.secrets["gcp_service_account"] 안에 JSON 키 내용이 들어있어야 함
-try:
-    SHEET_URL = st.secrets.get("private_gsheets_url", "") # 공유받은 시트 URL (선택사항)
-except:
-    SHEET_URL = ""
+# 집계(롤업) 파일 경로 (일별/월별/거래처별/품목별 합계, SQLite)
+ROLLUP_FILE = "po_rollups.db"
+ROLLUP_KEYS = ["day", "month", "client", "item"]
+
+# 저장소 상태 확인 결과 캐시 시간 (초)
+STATUS_CACHE_TTL = 300
+
+# 구글 시트 클라이언트 재사용 시간 (초)
+CLIENT_CACHE_TTL = 1800
+
+def get_sheet_url():
+    """
+    구글 시트 URL을 Secrets에서 가져옵니다. (모듈 로드 시점이 아닌 사용 시점에 읽음)
+    st.secrets["gcp_service_account"] 안에 JSON 키 내용이 들어있어야 함
+    """
+    try:
+        return st.secrets.get("private_gsheets_url", "") # 공유받은 시트 URL (선택사항)
+    except:
+        return ""
+
+@st.cache_resource(ttl=CLIENT_CACHE_TTL, show_spinner=False)
+def _authorize_client():
+    """
+    Google Sheets 클라이언트를 인증합니다. 성공한 클라이언트만 CLIENT_CACHE_TTL 동안 재사용합니다.
+    설정이 없거나 인증에 실패하면 예외를 발생시킵니다. (예외는 캐시되지 않으므로 다음 호출 때 다시 시도)
+    """
+    # Streamlit Cloud의 secrets 관리 기능을 사용
+    if "gcp_service_account" not in st.secrets:
+        raise KeyError("gcp_service_account")
+
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    # secrets 값을 dict로 변환
+    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
+    return gspread.authorize(creds)
 
 def get_google_sheet_client():
     """
@@ -28,18 +64,20 @@ def get_google_sheet_client():
         return None
 
     try:
-        # Streamlit Cloud의 secrets 관리 기능을 사용
-        if "gcp_service_account" in st.secrets:
-            # secrets 값을 dict로 변환
-            scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(st.secrets["gcp_service_account"]), scope)
-            client = gspread.authorize(creds)
-            return client
+        return _authorize_client()
     except Exception as e:
         # print(f"Google Sheet Auth Error: {e}") # 로그 과다 방지
         pass
     return None
 
+@st.cache_data(ttl=STATUS_CACHE_TTL, show_spinner=False)
+def get_storage_status():
+    """
+    사이드바 표시용 저장소 상태를 반환합니다. ("cloud" 또는 "local")
+    매 실행마다 인증하지 않도록 STATUS_CACHE_TTL 동안 결과를 재사용합니다.
+    """
+    return "cloud" if get_google_sheet_client() else "local"
+
 def get_sheet_instance(client):
     """
     작업할 워크시트를 가져옵니다.
@@ -47,8 +85,9 @@ def get_sheet_instance(client):
     """
     try:
         # 1. URL로 열기 (설정된 경우)
-        if SHEET_URL:
-            sh = client.open_by_url(SHEET_URL)
+        sheet_url = get_sheet_url()
+        if sheet_url:
+            sh = client.open_by_url(sheet_url)
         else:
             # 2. 이름으로 열기 (기본값: 'Smart_PO_DB')
             try:
@@ -107,10 +146,11 @@ def load_database():
     except Exception as e:
         return pd.DataFrame()
 
-def append_to_database(new_data_df):
+def append_to_database(new_data_df, file_hashes=None):
     """
     데이터를 추가합니다.
     Google Sheets와 로컬 CSV 모두에 저장을 시도합니다 (이중 백업).
+    file_hashes: {파일명: 해시} - 중복 파일 판별용으로 함께 기록 (선택)
     """
     if new_data_df.empty:
         return
@@ -122,6 +162,10 @@ def append_to_database(new_data_df):
     if '일자' in new_data_df.columns:
         new_data_df['일자'] = new_data_df['일자'].astype(str)
 
+    # 원본 파일 해시 기록 (중복 판별 인덱스를 데이터베이스에서 복구할 수 있도록)
+    if file_hashes and '파일명' in new_data_df.columns:
+        new_data_df[duplicate_index.HASH_COL] = new_data_df['파일명'].map(file_hashes).fillna("")
+
     # 1. Google Sheets 저장
     client = get_google_sheet_client()
     saved_to_cloud = False
@@ -130,17 +174,26 @@ def append_to_database(new_data_df):
         if worksheet:
             try:
                 # 헤더가 없으면(빈 시트면) 헤더 추가
-                if not worksheet.get_all_values():
-                    worksheet.append_row(new_data_df.columns.tolist())
+                header = worksheet.row_values(1)
+                if not header:
+                    header = new_data_df.columns.tolist()
+                    worksheet.append_row(header)
+                else:
+                    # 기존 헤더에 없는 컬럼(예: 파일해시)은 헤더 끝에 추가
+                    missing = [c for c in new_data_df.columns if c not in header]
+                    if missing:
+                        header = header + missing
+                        worksheet.update(range_name="A1", values=[header])
                 
-                # 데이터 추가
-                values = new_data_df.values.tolist()
+                # 데이터 추가 (시트의 헤더 순서에 맞춰 정렬)
+                values = new_data_df.reindex(columns=header).astype(object).where(lambda d: d.notna(), "").values.tolist()
                 worksheet.append_rows(values)
                 saved_to_cloud = True
             except Exception as e:
                 print(f"Cloud Save Error: {e}")
 
     # 2. 로컬 CSV 저장 (항상 수행)
+    saved_to_local = False
     try:
         current_db = pd.DataFrame()
         if os.path.exists(DB_FILE):
@@ -152,9 +205,178 @@ def append_to_database(new_data_df):
             updated_db = pd.concat([current_db, new_data_df], ignore_index=True)
             
         updated_db.to_csv(DB_FILE, index=False, encoding='utf-8-sig')
+        saved_to_local = True
     except Exception as e:
         print(f"Local Save Error: {e}")
 
+    # 어느 저장소에도 저장되지 않았으면 집계/인덱스에 반영하지 않음
+    if not (saved_to_cloud or saved_to_local):
+        return
+
+    # 3. 집계 테이블 갱신 (추가된 행만 반영)
+    try:
+        if os.path.exists(ROLLUP_FILE):
+            _add_rollups(new_data_df)
+        else:
+            # 집계 파일이 없으면(컨테이너 재시작 등) 전체 데이터로 다시 계산
+            rebuild_rollups()
+    except Exception as e:
+        print(f"Rollup Update Error: {e}")
+
+    # 4. 검색 인덱스 갱신
+    try:
+        if search_index.index_exists():
+            search_index.add_rows(new_data_df)
+        else:
+            # 인덱스가 없으면 방금 저장한 행만 들어가지 않도록 전체 데이터로 생성
+            rebuild_search_index()
+    except Exception as e:
+        print(f"Search Index Update Error: {e}")
+
+    # 5. 중복 판별 인덱스 갱신
+    try:
+        _ensure_duplicate_index()
+        duplicate_index.register(new_data_df)
+    except Exception as e:
+        print(f"Duplicate Index Update Error: {e}")
+
+    # 6. 조회용 사본 갱신
+    try:
+        if order_store.index_exists():
+            order_store.add_rows(new_data_df)
+        else:
+            rebuild_order_store()
+    except Exception as e:
+        print(f"Order Store Update Error: {e}")
+
+def _empty_rollups():
+    return {key: {} for key in ROLLUP_KEYS}
+
+def _accumulate_rollups(rollups, df):
+    """
+    DataFrame의 행들을 집계(dict)에 더합니다.
+    각 항목은 {"건수": 행 수, "수량": 수량 합계} 형태입니다.
+    """
+    if df.empty:
+        return rollups
+
+    dates = pd.to_datetime(df['일자'], errors='coerce') if '일자' in df.columns else pd.Series(pd.NaT, index=df.index)
+    qty = pd.to_numeric(df['수량'], errors='coerce').fillna(0) if '수량' in df.columns else pd.Series(0, index=df.index)
+
+    keys = pd.DataFrame({
+        "day": dates.dt.strftime('%Y-%m-%d').fillna("미상"),
+        "month": dates.dt.strftime('%Y-%m').fillna("미상"),
+        "client": df['거래처명'].fillna("").astype(str) if '거래처명' in df.columns else "",
+        "item": df['품목명(규격)'].fillna("").astype(str) if '품목명(규격)' in df.columns else "",
+        "qty": qty,
+    }, index=df.index)
+
+    for key in ROLLUP_KEYS:
+        grouped = keys.groupby(key)['qty'].agg(['count', 'sum'])
+        table = rollups.setdefault(key, {})
+        for name, row in grouped.iterrows():
+            entry = table.setdefault(str(name), {"건수": 0, "수량": 0})
+            entry["건수"] += int(row['count'])
+            entry["수량"] += float(row['sum'])
+    return rollups
+
+def _rollup_records(rollups):
+    return [
+        (key, name, entry["건수"], entry["수량"])
+        for key in ROLLUP_KEYS
+        for name, entry in rollups.get(key, {}).items()
+    ]
+
+def _connect_rollups():
+    # 동시에 여러 세션이 저장해도 합계가 유실되지 않도록 SQLite 트랜잭션 안에서 갱신
+    conn = sqlite3.connect(ROLLUP_FILE, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS rollups ("
+        "kind TEXT, name TEXT, row_count INTEGER, qty REAL, PRIMARY KEY (kind, name))"
+    )
+    return conn
+
+def _add_rollups(df):
+    """
+    새로 저장된 행들의 합계를 집계 테이블에 더합니다. (UPDATE ... + ? 방식, 한 트랜잭션)
+    """
+    conn = _connect_rollups()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO rollups VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(kind, name) DO UPDATE SET "
+                "row_count = row_count + excluded.row_count, qty = qty + excluded.qty",
+                _rollup_records(_accumulate_rollups(_empty_rollups(), df))
+            )
+    finally:
+        conn.close()
+
+def _read_rollups(conn):
+    rollups = _empty_rollups()
+    for kind, name, count, qty in conn.execute("SELECT kind, name, row_count, qty FROM rollups"):
+        rollups.setdefault(kind, {})[name] = {"건수": count, "수량": qty}
+    return rollups
+
+def load_rollups():
+    """
+    집계 테이블을 불러옵니다. 파일이 없으면 빈 집계를 반환합니다.
+    """
+    if not os.path.exists(ROLLUP_FILE):
+        return _empty_rollups()
+    conn = _connect_rollups()
+    try:
+        return _read_rollups(conn)
+    finally:
+        conn.close()
+
+def get_rollup(key):
+    """
+    지정한 기준(day/month/client/item)의 집계를 DataFrame으로 반환합니다.
+    원본 데이터를 다시 읽지 않으므로 누적 건수와 무관하게 빠르게 동작합니다.
+    (집계 파일이 없을 때만 전체 데이터로 한 번 계산)
+    """
+    if not os.path.exists(ROLLUP_FILE):
+        rebuild_rollups()
+    conn = _connect_rollups()
+    try:
+        rows = conn.execute(
+            "SELECT name, row_count, qty FROM rollups WHERE kind = ? ORDER BY name", (key,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame(rows, columns=[key, "건수", "수량"])
+
+def rebuild_rollups():
+    """
+    전체 데이터베이스로부터 집계 테이블을 다시 계산합니다. (정합성 점검용)
+    기존 집계와 달라진 항목 수를 함께 반환합니다.
+    """
+    rollups = _accumulate_rollups(_empty_rollups(), load_database())
+
+    conn = _connect_rollups()
+    try:
+        with conn:
+            previous = _read_rollups(conn)
+            conn.execute("DELETE FROM rollups")
+            conn.executemany("INSERT INTO rollups VALUES (?, ?, ?, ?)", _rollup_records(rollups))
+    finally:
+        conn.close()
+
+    mismatches = 0
+    for key in ROLLUP_KEYS:
+        names = set(previous.get(key, {})) | set(rollups[key])
+        for name in names:
+            if not _rollup_entry_equal(previous.get(key, {}).get(name), rollups[key].get(name)):
+                mismatches += 1
+    return rollups, mismatches
+
+def _rollup_entry_equal(a, b):
+    # 건수는 정확히, 수량(실수 합계)은 더한 순서에 따른 오차를 허용하여 비교
+    if a is None or b is None:
+        return a is b
+    return a["건수"] == b["건수"] and math.isclose(a["수량"], b["수량"], rel_tol=1e-9, abs_tol=1e-9)
+
 def reset_database():
     """
     데이터베이스를 초기화합니다.
@@ -172,7 +394,83 @@ def reset_database():
     # 2. 로컬 CSV 초기화
     if os.path.exists(DB_FILE):
         os.remove(DB_FILE)
+
+    # 3. 집계 테이블 초기화
+    if os.path.exists(ROLLUP_FILE):
+        os.remove(ROLLUP_FILE)
+
+    # 4. 검색 인덱스 초기화
+    search_index.clear_index()
+
+    # 5. 중복 판별 인덱스 초기화
+    duplicate_index.clear_index()
+
+    # 6. 조회용 사본 초기화
+    order_store.clear_index()
         
+def rebuild_search_index():
+    """
+    전체 데이터베이스로부터 검색 인덱스를 다시 만듭니다.
+    (인덱스 도입 이전 데이터 반영 또는 다른 곳에서 시트를 직접 수정한 경우)
+    """
+    df = load_database()
+    search_index.rebuild_index(df)
+    return len(df)
+
+def rebuild_duplicate_index():
+    """
+    전체 데이터베이스로부터 발주 지문과 파일 해시(중복 판별용)를 다시 만듭니다.
+    """
+    df = load_database()
+    duplicate_index.rebuild_index(df)
+    return len(df)
+
+def _ensure_duplicate_index():
+    # 인덱스 파일이 없으면(최초 사용, 컨테이너 재시작 등) 데이터베이스에서 자동으로 복구
+    if not duplicate_index.index_exists():
+        rebuild_duplicate_index()
+
+def hash_uploaded_file(file_obj):
+    """
+    업로드된 파일의 해시를 계산합니다. (중복 파일 판별용)
+    """
+    return duplicate_index.hash_file(file_obj)
+
+def find_known_file(file_hash):
+    """
+    이미 저장된 발주서 파일이면 당시 파일명을, 아니면 None을 반환합니다.
+    """
+    try:
+        _ensure_duplicate_index()
+        return duplicate_index.find_known_file(file_hash)
+    except Exception as e:
+        print(f"Duplicate Check Error: {e}")
+        return None
+
+def find_duplicate_orders(df):
+    """
+    이미 저장된 발주와 내용(일자, 거래처, 품목/수량)이 같은 행을 True로 표시합니다.
+    """
+    try:
+        _ensure_duplicate_index()
+        return duplicate_index.find_duplicate_orders(df)
+    except Exception as e:
+        print(f"Duplicate Check Error: {e}")
+        return pd.Series(False, index=df.index)
+
+def search_orders(query, limit=200):
+    """
+    거래처명/수화주/품목명/주소지/비고 통합 검색
+    반환값: (결과 DataFrame, 유사 검색 여부)
+    """
+    # 인덱스가 없으면(인덱스 도입 이전 데이터, 컨테이너 재시작 등) 데이터베이스에서 자동으로 생성
+    try:
+        if not search_index.index_exists():
+            rebuild_search_index()
+    except Exception as e:
+        print(f"Search Index Build Error: {e}")
+    return search_index.search(query, limit=limit)
+
 def get_filtered_data(start_date=None, end_date=None):
     """
     기간별 조회
@@ -196,3 +494,37 @@ def get_filtered_data(start_date=None, end_date=None):
         mask = mask & (df['일자'] <= pd.to_datetime(end_date))
         
     return df[mask]
+
+def rebuild_indexes():
+    """
+    원본 데이터를 한 번만 읽어 검색 인덱스, 중복 판별 인덱스, 조회용 사본을 모두 다시 만듭니다.
+    (다른 곳에서 시트를 직접 수정한 경우 등)
+    """
+    df = load_database()
+    search_index.rebuild_index(df)
+    duplicate_index.rebuild_index(df)
+    order_store.rebuild_index(df)
+    return len(df)
+
+def rebuild_order_store():
+    """
+    전체 데이터베이스로부터 조회용 사본을 다시 만듭니다.
+    """
+    df = load_database()
+    order_store.rebuild_index(df)
+    return len(df)
+
+def query_page(start_date=None, end_date=None, client=None, item=None,
+               sort_by='일자', ascending=False, page=1, page_size=100):
+    """
+    기간/거래처/품목 조건으로 조회한 결과 중 한 페이지만 반환합니다.
+    반환값: (해당 페이지 DataFrame, 조건에 맞는 전체 건수)
+    필터/정렬/페이지 나누기는 조회용 SQLite 사본에서 처리하므로, 화면을 다시 그릴 때마다
+    원본(Google Sheets / CSV) 전체를 읽지 않습니다.
+    """
+    # 사본이 없으면(최초 사용, 컨테이너 재시작 등) 데이터베이스에서 자동으로 생성
+    if not order_store.index_exists():
+        rebuild_order_store()
+    return order_store.query_page(start_date, end_date, client=client, item=item,
+                                  sort_by=sort_by, ascending=ascending,
+                                  page=page, page_size=page_size)
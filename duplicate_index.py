@@ -0,0 +1,175 @@
+import sqlite3
+import os
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+# 중복 발주 판별용 인덱스 파일 경로 (SQLite)
+# - file_hashes: 저장된 발주서 PDF의 SHA-256 해시 (분석 전 중복 파일 판별)
+# - order_fingerprints: (일자, 거래처, 품목 목록) 정규화 값의 해시 (저장 전 중복 내용 판별)
+INDEX_FILE = "po_fingerprints.db"
+
+# 저장된 행에 함께 기록하는 원본 파일 해시 컬럼 (인덱스 파일이 사라져도 복구 가능)
+HASH_COL = '파일해시'
+
+# 해시 계산 시 한 번에 읽는 크기 (파일 전체를 메모리에 올리지 않음)
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _connect():
+    conn = sqlite3.connect(INDEX_FILE)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS file_hashes ("
+        "hash TEXT PRIMARY KEY, filename TEXT, registered_at TEXT)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS order_fingerprints ("
+        "fingerprint TEXT PRIMARY KEY, order_date TEXT, client TEXT, registered_at TEXT)"
+    )
+    return conn
+
+
+def hash_file(file_obj):
+    """
+    파일 객체의 SHA-256 해시를 계산합니다. (조각 단위로 읽음)
+    """
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def find_known_file(file_hash):
+    """
+    이미 저장된 파일이면 최초 저장 시 파일명을, 아니면 None을 반환합니다.
+    """
+    if not os.path.exists(INDEX_FILE):
+        return None
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT filename FROM file_hashes WHERE hash = ?", (file_hash,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def _normalize_text(series):
+    # 공백 제거 + 소문자: "(주) OO건설" / "(주)OO건설" 을 같은 거래처로 취급
+    return series.fillna("").astype(str).str.replace(r"\s+", "", regex=True).str.lower()
+
+
+def order_fingerprints(df):
+    """
+    각 행이 속한 발주의 지문(fingerprint)을 계산합니다.
+    발주 단위는 (파일명, 일자, 거래처명)이며, 지문은 파일명을 제외한
+    (일자, 거래처명, 정렬된 품목/수량 목록)으로 만듭니다.
+    반환값: 행 인덱스에 맞춘 지문 Series
+    """
+    if df.empty:
+        return pd.Series(dtype=str)
+
+    dates = pd.to_datetime(df['일자'], errors='coerce') if '일자' in df.columns else pd.Series(pd.NaT, index=df.index)
+    qty = pd.to_numeric(df['수량'], errors='coerce') if '수량' in df.columns else pd.Series(float('nan'), index=df.index)
+
+    keys = pd.DataFrame({
+        "file": df['파일명'].fillna("").astype(str) if '파일명' in df.columns else "",
+        "date": dates.dt.strftime('%Y-%m-%d').fillna(""),
+        "client": _normalize_text(df['거래처명']) if '거래처명' in df.columns else "",
+        "line": (_normalize_text(df['품목명(규격)']) if '품목명(규격)' in df.columns else "")
+                + "|" + qty.map(lambda v: "" if pd.isna(v) else f"{v:.15g}"),
+    }, index=df.index)
+
+    fingerprints = pd.Series("", index=df.index, dtype=object)
+    for (_, date, client), group in keys.groupby(["file", "date", "client"], sort=False):
+        payload = "\x1f".join([date, client] + sorted(group["line"]))
+        fingerprints[group.index] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return fingerprints
+
+
+def find_duplicate_orders(df):
+    """
+    이미 저장된 발주와 내용이 같은 행을 찾습니다.
+    같은 배치 안에서 내용이 반복되는 발주도 두 번째부터 중복으로 표시합니다.
+    반환값: 중복 행이면 True인 bool Series
+    """
+    fingerprints = order_fingerprints(df)
+    if fingerprints.empty:
+        return pd.Series(False, index=df.index)
+
+    known = set()
+    if os.path.exists(INDEX_FILE):
+        conn = _connect()
+        try:
+            unique = list(set(fingerprints))
+            # SQLite 변수 개수 제한을 피하기 위해 나눠서 조회
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT fingerprint FROM order_fingerprints WHERE fingerprint IN ({', '.join('?' * len(part))})",
+                    part
+                ).fetchall()
+                known.update(r[0] for r in rows)
+        finally:
+            conn.close()
+
+    # 배치 내 반복: 같은 지문이 다른 발주(파일)에서 다시 나오는 경우
+    files = df['파일명'].fillna("").astype(str) if '파일명' in df.columns else pd.Series("", index=df.index)
+    first_file = pd.DataFrame({"fp": fingerprints, "file": files}).groupby("fp")["file"].transform("first")
+    repeated = files != first_file
+
+    return fingerprints.isin(known) | repeated
+
+
+def register(df, file_hashes=None):
+    """
+    저장된 행들의 발주 지문과 파일 해시를 인덱스에 기록합니다.
+    파일 해시는 행의 HASH_COL 컬럼과 file_hashes({파일명: 해시}, 선택)에서 가져옵니다.
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn = _connect()
+    try:
+        with conn:
+            if not df.empty:
+                fingerprints = order_fingerprints(df)
+                dates = pd.to_datetime(df['일자'], errors='coerce').dt.strftime('%Y-%m-%d').fillna("") if '일자' in df.columns else pd.Series("", index=df.index)
+                clients = df['거래처명'].fillna("").astype(str) if '거래처명' in df.columns else pd.Series("", index=df.index)
+                records = pd.DataFrame({"fp": fingerprints, "date": dates, "client": clients}).drop_duplicates("fp")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO order_fingerprints VALUES (?, ?, ?, ?)",
+                    [(fp, date, client, now) for fp, date, client in records.itertuples(index=False, name=None)]
+                )
+            pairs = [(h, name) for name, h in (file_hashes or {}).items()]
+            if HASH_COL in df.columns:
+                names = df['파일명'].fillna("").astype(str) if '파일명' in df.columns else pd.Series("", index=df.index)
+                hashes = df[HASH_COL].fillna("").astype(str)
+                pairs += [(h, name) for h, name in zip(hashes, names) if h]
+            if pairs:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO file_hashes VALUES (?, ?, ?)",
+                    [(h, name, now) for h, name in dict(pairs).items()]
+                )
+    finally:
+        conn.close()
+
+
+def rebuild_index(df):
+    """
+    전체 데이터로 발주 지문과 파일 해시 인덱스를 다시 만듭니다.
+    (파일 해시는 저장된 행의 HASH_COL 컬럼에서 복구)
+    """
+    clear_index()
+    register(df)
+
+
+def index_exists():
+    return os.path.exists(INDEX_FILE)
+
+
+def clear_index():
+    """
+    중복 판별 인덱스를 삭제합니다.
+    """
+    if os.path.exists(INDEX_FILE):
+        os.remove(INDEX_FILE)
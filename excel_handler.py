@@ -1,15 +1,210 @@
 
 import pandas as pd
 import io
+import re
+import math
+import numbers
+import hashlib
+import threading
+import zipfile
+from collections import OrderedDict
 from datetime import datetime
-from openpyxl.utils import get_column_letter
+from xml.sax.saxutils import escape
+from order_model import OrderLine, lines_from_parsed_json, lines_to_frame
+
+# [내보내기 캐시] 월별 시트 조각: {(시트명, 컬럼 목록, 데이터 버전): (행 XML 목록, 열별 최대 길이, 크기)}
+# 지난 달 데이터는 거의 바뀌지 않으므로, 버전이 같은 달은 셀을 다시 만들지 않고 저장된 행 XML을 그대로 조립합니다.
+# 여러 세션이 함께 사용하므로 잠금을 걸고, 전체 크기를 제한하여 오래 쓰지 않은 조각부터 버립니다.
+_PART_CACHE = OrderedDict()
+_PART_CACHE_LOCK = threading.Lock()
+_PART_CACHE_MAX_BYTES = 128 * 1024 * 1024
+_part_cache_bytes = 0
+
+# XML에 쓸 수 없는 제어 문자
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+)
+
+# 기본 서식만 있는 스타일 시트 (pandas to_excel 출력과 같이 헤더도 기본 서식)
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+def _text_length(value):
+    """엑셀 열 너비 계산용 길이 (CP949 바이트 수, 빈 값/인코딩 불가 값은 0)"""
+    try:
+        if value is None or value != value or not value:  # None / NaN / 빈 값
+            return 0
+        # CP949 인코딩 길이 사용 (한글 2바이트, 영문 1바이트)
+        # 엑셀의 열 너비는 바이트 수와 유사하게 작동하므로 더 정확함
+        return len(str(value).encode('cp949'))
+    except:
+        return 0
+
+def _column_lengths(frame):
+    """시트에 쓸 DataFrame에서 열별 최대 길이(헤더 포함)를 계산합니다."""
+    return [
+        max([_text_length(col)] + [_text_length(v) for v in frame[col]])
+        for col in frame.columns
+    ]
+
+def _cell_xml(value):
+    """
+    셀 1개의 XML. 셀 위치(r 속성)를 쓰지 않으므로 같은 행 XML을 월별 시트와 전체내역 시트에 함께 쓸 수 있습니다.
+    (빈 셀도 <c/>로 자리를 채워 다음 셀 위치가 밀리지 않게 함)
+    """
+    if value is None or value is pd.NaT or (isinstance(value, float) and math.isnan(value)):
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, numbers.Number) and math.isfinite(value):
+        number = float(value)
+        text = str(int(number)) if number.is_integer() else repr(number)
+        return f"<c><v>{text}</v></c>"
+    text = _ILLEGAL_XML_CHARS.sub("", str(value))
+    if not text:
+        return "<c/>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+def _row_xml(values):
+    return "<row>" + "".join(_cell_xml(v) for v in values) + "</row>"
+
+def _cache_get(key):
+    with _PART_CACHE_LOCK:
+        cached = _PART_CACHE.get(key)
+        if cached is None:
+            return None
+        _PART_CACHE.move_to_end(key)
+        return cached[0], cached[1]
+
+def _cache_put(key, rows, lengths):
+    global _part_cache_bytes
+    size = sum(len(r) for r in rows) + 64 * len(rows)  # 대략적인 크기 (문자 수 + 객체 오버헤드)
+    if size > _PART_CACHE_MAX_BYTES:
+        return
+    with _PART_CACHE_LOCK:
+        old = _PART_CACHE.pop(key, None)
+        if old is not None:
+            _part_cache_bytes -= old[2]
+        _PART_CACHE[key] = (rows, lengths, size)
+        _part_cache_bytes += size
+        while _part_cache_bytes > _PART_CACHE_MAX_BYTES:
+            _, evicted = _PART_CACHE.popitem(last=False)
+            _part_cache_bytes -= evicted[2]
+
+def _hash_frame(frame):
+    """
+    버전 계산용 DataFrame. 같은 값이 열 dtype에 따라 다른 해시가 되지 않도록 문자열로 통일합니다.
+    (예: 비어 있던 '비고' 열은 float NaN이지만, 한 행이라도 입력되면 object 열이 됨)
+    """
+    normalized = {}
+    for col in frame.columns:
+        values = frame[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            values = values.astype('float64')
+        normalized[col] = values.astype('string')
+    return pd.DataFrame(normalized, index=frame.index)
+
+def _render_part(name, frame, row_hashes):
+    """
+    시트 조각(월별 또는 일자 없는 행)의 행 XML과 열별 최대 길이를 캐시에서 가져오거나 새로 만듭니다.
+    버전은 조각의 행 해시(순서 포함)로 정하므로, 행이 추가/수정/삭제된 달만 다시 만들어집니다.
+    """
+    version = hashlib.sha1(row_hashes.values.tobytes()).hexdigest()
+    key = (name, tuple(frame.columns), len(frame), version)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    rows = [_row_xml(values) for values in frame.itertuples(index=False, name=None)]
+    lengths = _column_lengths(frame)
+    _cache_put(key, rows, lengths)
+    return rows, lengths
+
+def _column_width(max_length):
+    # 최소 10, 최대 100으로 제한 (여유값 2 추가 및 1.1배)
+    return min(max((max_length + 2) * 1.1, 10), 100)
+
+def _write_sheet(zf, index, header_xml, rows, lengths):
+    cols = "".join(
+        f'<col min="{i}" max="{i}" width="{_column_width(n):.2f}" customWidth="1"/>'
+        for i, n in enumerate(lengths, start=1)
+    )
+    with zf.open(f"xl/worksheets/sheet{index}.xml", "w") as f:
+        f.write(f"{_SHEET_HEADER}<cols>{cols}</cols><sheetData>{header_xml}".encode("utf-8"))
+        # 큰 시트도 한 번에 문자열로 합치지 않고 나눠서 기록
+        for i in range(0, len(rows), 1000):
+            f.write("".join(rows[i:i + 1000]).encode("utf-8"))
+        f.write(b"</sheetData></worksheet>")
+
+def _write_workbook(zf, sheet_names):
+    sheets = "".join(
+        f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+        for i, name in enumerate(sheet_names, start=1)
+    )
+    sheet_rels = "".join(
+        f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, len(sheet_names) + 1)
+    )
+    sheet_types = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(sheet_names) + 1)
+    )
+    styles_id = len(sheet_names) + 1
+    zf.writestr("[Content_Types].xml", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{sheet_types}</Types>'
+    ))
+    zf.writestr("_rels/.rels", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ))
+    zf.writestr("xl/workbook.xml", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets>{sheets}</sheets></workbook>'
+    ))
+    zf.writestr("xl/_rels/workbook.xml.rels", (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'{sheet_rels}'
+        f'<Relationship Id="rId{styles_id}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ))
+    zf.writestr("xl/styles.xml", _STYLES_XML)
 
 def create_excel_with_tabs(processed_data):
     """
     처리된 데이터를 받아 일별/주별/월별 탭이 있는 엑셀 파일을 생성합니다.
-    processed_data: list of dict (이미 평탄화된 데이터)
+    processed_data: DataFrame, OrderLine 목록 또는 list of dict (이미 평탄화된 데이터)
+    월별 시트의 행 XML은 (월, 데이터 버전)별로 캐시하여, 지난 내보내기 이후 바뀐 달만 다시 만듭니다.
     """
-    df = pd.DataFrame(processed_data)
+    if isinstance(processed_data, pd.DataFrame):
+        df = processed_data.copy()
+    elif processed_data and isinstance(processed_data[0], OrderLine):
+        df = lines_to_frame(processed_data)
+    else:
+        df = pd.DataFrame(processed_data)
     
     # 날짜 형식 변환
     if '일자' in df.columns:
@@ -17,50 +212,50 @@ def create_excel_with_tabs(processed_data):
     
     output = io.BytesIO()
     
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zf:
+        sheet_names = []
         # 1. 전체 데이터 (Raw Data)
         if not df.empty:
+            df = df.reset_index(drop=True)
             df['일자_str'] = df['일자'].dt.strftime('%Y-%m-%d') # 엑셀 출력을 위한 문자열
             # 출력 컬럼 순서 정리 (사용자 요청: 품목명과 규격 통합)
             cols = ['일자_str', '거래처명', '품목명(규격)', '수량', '수화주', '전화번호', '주소지', '지불유형', '비고']
             # 존재하는 컬럼만 선택
             final_cols = [c for c in cols if c in df.columns]
-            
-            # 전체 시트
-            df[final_cols].to_excel(writer, sheet_name='전체내역', index=False)
+            header_xml = _row_xml(final_cols)
+
+            # 행 단위 해시 (벡터 연산, 조각 버전 계산에 사용)
+            row_hashes = pd.util.hash_pandas_object(_hash_frame(df[final_cols]), index=False)
+
+            # '일자' 기준 월별 조각 (일자 없는 행은 전체내역에만 포함)
+            df['month'] = df['일자_str'].str[:7]
+            months = [m if isinstance(m, str) else None for m in df['month']]
+            groups = df.groupby('month', dropna=False, sort=True)
+            parts = {}
+            for month, group in groups:
+                key = month if isinstance(month, str) else None
+                parts[key] = _render_part(key, group[final_cols], row_hashes[group.index])
+
+            # [자동 열 너비 조정] 전체 시트는 조각별 최대 길이의 최대값
+            total_lengths = [max(lengths[i] for _, lengths in parts.values()) for i in range(len(final_cols))]
+
+            # 전체 시트 (원래 행 순서 유지: 각 행이 속한 조각에서 행 XML을 가져옴)
+            positions = groups.cumcount()
+            all_rows = [parts[m][0][p] for m, p in zip(months, positions)]
+            sheet_names.append('전체내역')
+            _write_sheet(zf, len(sheet_names), header_xml, all_rows, total_lengths)
             
             # 2. 월별 시트 (예: 2024-05)
-            # '일자' 기준 그룹화
-            if '일자' in df.columns and not df['일자'].isna().all():
-                df['month'] = df['일자'].dt.strftime('%Y-%m')
-                for month, group in df.groupby('month'):
-                    sheet_name = f"{month}월"
-                    group[final_cols].to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        # [자동 열 너비 조정]
-        # 모든 시트를 순회하며 각 열의 너비를 내용에 맞게 조정
-        for sheet_name in writer.sheets:
-            worksheet = writer.sheets[sheet_name]
-            for column_cells in worksheet.columns:
-                max_length = 0
-                if not column_cells:
+            for month, (rows, lengths) in parts.items():
+                if month is None:
                     continue
-                column = column_cells[0].column_letter # Get the column name
-                
-                for cell in column_cells:
-                    try:
-                        if cell.value:
-                            # CP949 인코딩 길이 사용 (한글 2바이트, 영문 1바이트)
-                            # 엑셀의 열 너비는 바이트 수와 유사하게 작동하므로 더 정확함
-                            length = len(str(cell.value).encode('cp949'))
-                            if length > max_length:
-                                max_length = length
-                    except:
-                        pass
-                
-                # 최소 10, 최대 100으로 제한 (여유값 2 추가 및 1.1배)
-                adjusted_width = min(max((max_length + 2) * 1.1, 10), 100)
-                worksheet.column_dimensions[column].width = adjusted_width
+                sheet_names.append(f"{month}월")
+                _write_sheet(zf, len(sheet_names), header_xml, rows, lengths)
+        else:
+            # 빈 통합 문서는 열리지 않으므로 빈 시트 하나를 둠
+            sheet_names.append('전체내역')
+            _write_sheet(zf, 1, "", [], [])
+        _write_workbook(zf, sheet_names)
 
     output.seek(0)
     return output
@@ -68,40 +263,6 @@ def create_excel_with_tabs(processed_data):
 def flatten_json_to_rows(parsed_json, filename):
     """
     LLM에서 받은 JSON 구조(품목 리스트 포함)를 엑셀 행 단위로 평탄화합니다.
+    반환값: OrderLine 목록 (같은 발주의 행들은 공통 정보를 복사하지 않고 공유)
     """
-    rows = []
-    
-    # 기본 정보
-    base_info = {
-        "일자": parsed_json.get("order_date", ""),
-        "거래처명": parsed_json.get("client_name", ""),
-        "전화번호": parsed_json.get("phone_number", ""),
-        "주소지": parsed_json.get("address", ""),
-        "수화주": parsed_json.get("consignee", ""),
-        "지불유형": parsed_json.get("payment_type", ""),
-        "비고": parsed_json.get("remarks", ""),
-        "파일명": filename
-    }
-    
-    items = parsed_json.get("items", [])
-    if not items:
-        # 품목이 없어도 기본 정보는 한 줄로 추가
-        rows.append(base_info)
-    else:
-        for item in items:
-            row = base_info.copy()
-            
-            # 품목명과 규격 합치기 로직
-            item_name = item.get("item_name", "")
-            spec = item.get("spec", "")
-            
-            if spec:
-                combined_name = f"{item_name}[{spec}]"
-            else:
-                combined_name = item_name
-                
-            row["품목명(규격)"] = combined_name
-            row["수량"] = item.get("qty", 0)
-            rows.append(row)
-            
-    return rows
+    return lines_from_parsed_json(parsed_json, filename)
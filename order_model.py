@@ -0,0 +1,124 @@
+import re
+from dataclasses import dataclass
+import pandas as pd
+
+# 화면/엑셀/DB에서 사용하는 컬럼명 (행 단위 표 형식)
+ROW_COLUMNS = ['일자', '거래처명', '전화번호', '주소지', '수화주', '지불유형', '비고', '파일명', '품목명(규격)', '수량']
+
+_DATE_PATTERN = re.compile(r"(\d{4})\D+(\d{1,2})\D+(\d{1,2})")
+_NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _to_text(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def _to_date(value):
+    """
+    '2024-05-20', '2024.5.20', '2024년 5월 20일' 등을 'YYYY-MM-DD'로 통일합니다.
+    해석할 수 없으면 원문을 그대로 둡니다. (사용자가 검토 화면에서 수정)
+    """
+    text = _to_text(value)
+    match = _DATE_PATTERN.search(text)
+    if not match:
+        return text
+    year, month, day = (int(g) for g in match.groups())
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return text
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def _to_qty(value):
+    """
+    10, "10", "1,000", "10개" 등을 숫자로 변환합니다.
+    숫자가 없으면("일식", "한 박스", "-" 등) None으로 두어 0개와 구분합니다. (표에는 빈 값으로 표시)
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    match = _NUMBER_PATTERN.search(_to_text(value).replace(",", ""))
+    if not match:
+        return None
+    number = float(match.group())
+    return int(number) if number.is_integer() else number
+
+
+@dataclass
+class OrderHeader:
+    """
+    발주서 1건의 공통 정보. 같은 발주의 품목 행들이 하나의 객체를 공유합니다.
+    """
+    __slots__ = ('order_date', 'client_name', 'phone_number', 'address',
+                 'consignee', 'payment_type', 'remarks', 'filename')
+    order_date: str
+    client_name: str
+    phone_number: str
+    address: str
+    consignee: str
+    payment_type: str
+    remarks: str
+    filename: str
+
+
+@dataclass
+class OrderLine:
+    """
+    발주서의 품목 1행. 품목이 없는 발주는 item_name이 빈 문자열, qty가 None인 1행으로 표현합니다.
+    """
+    __slots__ = ('header', 'item_name', 'qty')
+    header: OrderHeader
+    item_name: str
+    qty: object
+
+    def to_row(self):
+        h = self.header
+        return [h.order_date, h.client_name, h.phone_number, h.address, h.consignee,
+                h.payment_type, h.remarks, h.filename, self.item_name, self.qty]
+
+
+def lines_from_parsed_json(parsed_json, filename):
+    """
+    LLM에서 받은 JSON을 검증/형변환하여 OrderLine 목록으로 만듭니다.
+    형변환은 여기(추출 직후) 한 번만 수행합니다.
+    """
+    header = OrderHeader(
+        order_date=_to_date(parsed_json.get("order_date")),
+        client_name=_to_text(parsed_json.get("client_name")),
+        phone_number=_to_text(parsed_json.get("phone_number")),
+        address=_to_text(parsed_json.get("address")),
+        consignee=_to_text(parsed_json.get("consignee")),
+        payment_type=_to_text(parsed_json.get("payment_type")),
+        remarks=_to_text(parsed_json.get("remarks")),
+        filename=filename,
+    )
+
+    items = parsed_json.get("items") or []
+    if not isinstance(items, list):
+        items = [items]
+
+    lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        # 품목명과 규격 합치기 로직
+        item_name = _to_text(item.get("item_name"))
+        spec = _to_text(item.get("spec"))
+        combined_name = f"{item_name}[{spec}]" if spec else item_name
+        lines.append(OrderLine(header, combined_name, _to_qty(item.get("qty"))))
+
+    if not lines:
+        # 품목이 없어도 기본 정보는 한 줄로 추가
+        lines.append(OrderLine(header, "", None))
+    return lines
+
+
+def lines_to_frame(lines):
+    """
+    OrderLine 목록을 DataFrame으로 변환합니다. (dict 변환 없이 행 목록에서 바로 생성)
+    """
+    return pd.DataFrame([line.to_row() for line in lines], columns=ROW_COLUMNS)
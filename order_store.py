@@ -0,0 +1,134 @@
+import sqlite3
+import os
+import pandas as pd
+
+# 조회 화면용 발주 데이터 사본 (SQLite)
+# 원본(Google Sheets / CSV)을 매번 전부 읽지 않고, 필터/정렬/페이지 나누기를 SQL로 처리합니다.
+INDEX_FILE = "po_orders.db"
+
+# 사본에 보관하는 컬럼 (화면에 표시하는 컬럼만)
+TEXT_COLS = ['거래처명', '품목명(규격)', '수화주', '전화번호', '주소지', '지불유형', '비고', '파일명']
+ALL_COLS = ['일자'] + TEXT_COLS + ['수량', '등록일시']
+
+# SQLite 컬럼명 (한글/괄호 컬럼명을 그대로 쓰지 않기 위함)
+_FIELD_NAMES = ['order_date', 'client', 'item', 'consignee', 'phone', 'address', 'payment_type',
+                'remarks', 'filename', 'qty', 'registered_at']
+_FIELD_BY_COL = dict(zip(ALL_COLS, _FIELD_NAMES))
+
+
+def _connect():
+    conn = sqlite3.connect(INDEX_FILE, timeout=30)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS orders (
+            {', '.join(f'{name} REAL' if name == 'qty' else f'{name} TEXT' for name in _FIELD_NAMES)}
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (order_date)")
+    return conn
+
+
+def _to_records(df):
+    """DataFrame을 사본 테이블에 넣을 튜플 목록으로 변환합니다. (날짜/수량 형 통일)"""
+    values = pd.DataFrame(index=df.index)
+    for col in TEXT_COLS:
+        values[col] = df[col].fillna("").astype(str) if col in df.columns else ""
+    dates = pd.to_datetime(df['일자'], errors='coerce') if '일자' in df.columns else pd.Series(pd.NaT, index=df.index)
+    values['일자'] = dates.dt.strftime('%Y-%m-%d')
+    qty = pd.to_numeric(df['수량'], errors='coerce') if '수량' in df.columns else pd.Series(float('nan'), index=df.index)
+    values['수량'] = qty
+    registered = pd.to_datetime(df['등록일시'], errors='coerce') if '등록일시' in df.columns else pd.Series(pd.NaT, index=df.index)
+    values['등록일시'] = registered.dt.strftime('%Y-%m-%d %H:%M:%S')
+    values = values[ALL_COLS].astype(object).where(lambda d: d.notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def add_rows(df):
+    """
+    새로 저장된 행들을 사본에 추가합니다.
+    """
+    if df.empty:
+        return
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany(
+                f"INSERT INTO orders ({', '.join(_FIELD_NAMES)}) VALUES ({', '.join('?' * len(_FIELD_NAMES))})",
+                _to_records(df)
+            )
+    finally:
+        conn.close()
+
+
+def rebuild_index(df):
+    """
+    전체 데이터로 사본을 다시 만듭니다. (데이터가 없어도 빈 파일을 생성)
+    """
+    clear_index()
+    _connect().close()
+    add_rows(df)
+
+
+def index_exists():
+    return os.path.exists(INDEX_FILE)
+
+
+def clear_index():
+    """
+    사본을 삭제합니다.
+    """
+    if os.path.exists(INDEX_FILE):
+        os.remove(INDEX_FILE)
+
+
+def _like_pattern(text):
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def query_page(start_date=None, end_date=None, client=None, item=None,
+               sort_by='일자', ascending=False, page=1, page_size=100):
+    """
+    조건에 맞는 행 수(COUNT)와 한 페이지(ORDER BY ... LIMIT/OFFSET)만 조회합니다.
+    반환값: (해당 페이지 DataFrame, 조건에 맞는 전체 건수)
+    """
+    where = []
+    params = []
+    if start_date:
+        where.append("order_date >= ?")
+        params.append(pd.to_datetime(start_date).strftime('%Y-%m-%d'))
+    if end_date:
+        where.append("order_date <= ?")
+        params.append(pd.to_datetime(end_date).strftime('%Y-%m-%d'))
+    if client:
+        where.append("client LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(client))
+    if item:
+        where.append("item LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(item))
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    # 정렬 컬럼은 허용된 컬럼명만 사용 (빈 값은 항상 마지막)
+    field = _FIELD_BY_COL.get(sort_by, 'order_date')
+    direction = "ASC" if ascending else "DESC"
+    order_sql = f"ORDER BY {field} IS NULL, {field} {direction}, rowid"
+
+    conn = _connect()
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM orders {where_sql}", params).fetchone()[0]
+        if total == 0:
+            return pd.DataFrame(columns=ALL_COLS), 0
+
+        # 페이지 범위 보정
+        page_size = max(int(page_size), 1)
+        last_page = (total - 1) // page_size + 1
+        page = min(max(int(page), 1), last_page)
+
+        rows = conn.execute(
+            f"SELECT {', '.join(_FIELD_NAMES)} FROM orders {where_sql} {order_sql} LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return pd.DataFrame(rows, columns=ALL_COLS), total
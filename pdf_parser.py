@@ -2,32 +2,70 @@
 import fitz  # PyMuPDF
 import google.generativeai as genai
 from google.api_core import exceptions # 예외 처리용 추가
-from PIL import Image
-import io
 import json
 import time
 
 # 우리 회사 키워드 (제외 대상)
 OUR_COMPANY_KEYWORDS = ["(주)피엘에스", "피엘에스", "PLS"]
 
+# [메모리 예산] 페이지 렌더링 배율과 페이지당 최대 픽셀 수
+# A4 한 장을 2배로 렌더링하면 약 200만 픽셀이며, 대형 도면 스캔 등은 최대 픽셀 수에 맞춰 축소합니다.
+RENDER_SCALE = 2
+MAX_PAGE_PIXELS = 12_000_000
+
+# [묶음 분석] 이 페이지 수 이하의 짧은 발주서는 여러 건을 한 번의 요청으로 분석합니다.
+PACK_MAX_PAGES = 1
+PACK_SIZE = 4
+
+# 모델 요청 사이 대기 시간 (초, 할당량 초과 방지)
+REQUEST_INTERVAL = 5
+
+# 추출 항목 (단건/묶음 프롬프트 공통)
+FIELDS_DESCRIPTION = f"order_date, client_name({', '.join(OUR_COMPANY_KEYWORDS)} 제외), phone_number, address, consignee, payment_type, remarks, items"
+
 class PRExtractor:
     def __init__(self, api_key):
         genai.configure(api_key=api_key)
 
-    def parse_with_llm(self, file_bytes):
+    @staticmethod
+    def render_pages(file_source):
+        """
+        PDF의 각 페이지를 PNG 바이트로 변환합니다.
+        file_source: PDF 파일 경로(권장) 또는 bytes
+        - 경로로 열면 PDF 전체를 메모리에 올리지 않고 필요한 페이지만 읽습니다.
+        - 비트맵(pixmap)은 PNG로 압축한 직후 해제하고, 압축된 PNG 바이트만 보관합니다.
+        """
+        if isinstance(file_source, (bytes, bytearray)):
+            doc = fitz.open(stream=file_source, filetype="pdf")
+        else:
+            doc = fitz.open(file_source)
+
+        pages = []
+        try:
+            for page in doc:
+                scale = RENDER_SCALE
+                pixels = page.rect.width * page.rect.height * scale * scale
+                if pixels > MAX_PAGE_PIXELS:
+                    scale = scale * (MAX_PAGE_PIXELS / pixels) ** 0.5
+                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+                pages.append(pix.tobytes("png"))
+                pix = None
+        finally:
+            doc.close()
+        return pages
+
+    def parse_with_llm(self, file_source):
         """
         PDF 이미지를 분석합니다.
         복잡한 재시도 로직 없이, 가장 확실한 모델을 찾아 한 번에 실행합니다.
+        file_source: PDF 파일 경로 또는 bytes
         """
-        # 1. PDF -> 이미지 변환
+        # 1. PDF -> 이미지 변환 (PNG 바이트 그대로 전달, PIL 이미지로 풀지 않음)
         try:
-            doc = fitz.open(stream=file_bytes, filetype="pdf")
-            images = []
-            for page in doc:
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                img_data = pix.tobytes("png")
-                img = Image.open(io.BytesIO(img_data))
-                images.append(img)
+            images = [
+                {"mime_type": "image/png", "data": png}
+                for png in self.render_pages(file_source)
+            ]
             
             if not images:
                 return {"error": "PDF를 이미지로 변환할 수 없습니다."}
@@ -39,7 +77,7 @@ class PRExtractor:
             당신은 발주서 처리 AI입니다. 이미지를 분석하여 아래 정보를 JSON 형식으로 추출하세요.
             마크다운이나 설명 없이 오직 JSON 문자열만 반환해야 합니다.
             
-            추출 항목: order_date, client_name({', '.join(OUR_COMPANY_KEYWORDS)} 제외), phone_number, address, consignee, payment_type, remarks, items
+            추출 항목: {FIELDS_DESCRIPTION}
             
             ### 예시 JSON:
             {{
@@ -52,6 +90,160 @@ class PRExtractor:
         """
         inputs = [prompt] + images
 
+        result_json, used_model, last_error, _ = self._generate_json(inputs)
+        if isinstance(result_json, dict):
+            # 성공 시 사용된 모델명 기록
+            result_json['_used_model'] = used_model
+            return result_json
+        if result_json is not None:
+            last_error = f"{used_model}: JSON 객체가 아닌 응답"
+        
+        # 실패 시 에러 리턴
+        return {"error": f"분석 실패 ({used_model}). (Last Error: {last_error})"}
+
+    @staticmethod
+    def page_count(file_source):
+        """
+        PDF 페이지 수를 반환합니다. (렌더링 없이 확인, 실패 시 0)
+        """
+        try:
+            if isinstance(file_source, (bytes, bytearray)):
+                doc = fitz.open(stream=file_source, filetype="pdf")
+            else:
+                doc = fitz.open(file_source)
+            try:
+                return doc.page_count
+            finally:
+                doc.close()
+        except Exception:
+            return 0
+
+    def make_packs(self, file_sources):
+        """
+        파일들을 요청 단위로 묶습니다.
+        PACK_MAX_PAGES 이하의 짧은 문서는 PACK_SIZE개씩 묶고, 긴 문서는 단독 요청으로 둡니다.
+        반환값: 파일 인덱스 목록의 목록 (예: [[0, 1, 2, 3], [4], [5, 6]])
+        """
+        packs = []
+        current = []
+        for idx, source in enumerate(file_sources):
+            pages = self.page_count(source)
+            if 0 < pages <= PACK_MAX_PAGES:
+                current.append(idx)
+                if len(current) >= PACK_SIZE:
+                    packs.append(current)
+                    current = []
+            else:
+                packs.append([idx])
+        if current:
+            packs.append(current)
+        return packs
+
+    def parse_pack(self, file_sources):
+        """
+        여러 발주서를 한 번의 요청으로 분석합니다.
+        결과는 문서별로 나누어 검증하고, 응답에서 누락되었거나 형식이 잘못된 문서만 단건 분석으로 다시 처리합니다.
+        묶음 응답 전체를 JSON으로 해석할 수 없으면 모든 문서를 단건 분석으로 다시 처리하고,
+        요청 자체가 (재시도 후에도) 실패하면(할당량 초과 등) 추가 요청 없이 모든 문서에 에러를 반환합니다.
+        반환값: file_sources와 같은 순서의 결과 목록 (각 결과는 parse_with_llm과 같은 형식)
+        """
+        if len(file_sources) == 1:
+            return [self.parse_with_llm(file_sources[0])]
+
+        # 1. 문서별 이미지 준비 (문서 구분 표시 후 해당 문서의 페이지들)
+        doc_ids = [f"doc_{i + 1}" for i in range(len(file_sources))]
+        results = [None] * len(file_sources)
+        parts = []
+        packed_ids = []
+        for i, (doc_id, source) in enumerate(zip(doc_ids, file_sources)):
+            try:
+                pages = self.render_pages(source)
+            except Exception as e:
+                results[i] = {"error": f"PDF 변환 실패: {str(e)}"}
+                continue
+            if not pages:
+                results[i] = {"error": "PDF를 이미지로 변환할 수 없습니다."}
+                continue
+            parts.append(f"[문서 {doc_id}]")
+            parts.extend({"mime_type": "image/png", "data": png} for png in pages)
+            packed_ids.append(doc_id)
+
+        if not packed_ids:
+            return results
+
+        # 2. 묶음 프롬프트
+        prompt = f"""
+            당신은 발주서 처리 AI입니다. 여러 개의 서로 다른 발주서 문서가 순서대로 주어집니다.
+            각 문서의 이미지 앞에는 "[문서 doc_번호]" 표시가 있습니다. 문서끼리 정보를 섞지 마세요.
+            문서마다 아래 정보를 추출하여 JSON 배열로 반환하세요. 배열의 각 원소에는 "doc_id"를 반드시 포함합니다.
+            마크다운이나 설명 없이 오직 JSON 문자열만 반환해야 합니다.
+            
+            문서 목록: {', '.join(packed_ids)}
+            추출 항목: {FIELDS_DESCRIPTION}
+            
+            ### 예시 JSON:
+            [
+                {{
+                    "doc_id": "doc_1",
+                    "order_date": "2024-05-20",
+                    "client_name": "oo건설",
+                    "items": [
+                        {{"item_name": "품명", "spec": "규격", "qty": 10}}
+                    ]
+                }}
+            ]
+        """
+        result_json, used_model, last_error, parse_failed = self._generate_json([prompt] + parts)
+        parts = None
+
+        # 요청 자체가 실패 (할당량 초과 등): 단건 요청으로 부하를 늘리지 않고 에러 반환
+        # (응답은 받았지만 JSON 해석에 실패한 경우는 아래에서 문서별 단건 분석으로 처리)
+        if result_json is None and not parse_failed:
+            for i, doc_id in enumerate(doc_ids):
+                if doc_id in packed_ids:
+                    results[i] = {"error": f"묶음 분석 실패 ({used_model}). (Last Error: {last_error})"}
+            return results
+
+        # 3. 문서별 분리 및 검증
+        by_doc = {}
+        if isinstance(result_json, dict):
+            result_json = result_json.get("documents", [result_json])
+        if isinstance(result_json, list):
+            for entry in result_json:
+                if isinstance(entry, dict) and entry.get("doc_id") in packed_ids:
+                    by_doc.setdefault(entry["doc_id"], entry)
+
+        for i, (doc_id, source) in enumerate(zip(doc_ids, file_sources)):
+            if doc_id not in packed_ids:
+                continue
+            entry = by_doc.get(doc_id)
+            if self._is_valid_result(entry):
+                entry = dict(entry)
+                entry.pop("doc_id", None)
+                entry['_used_model'] = f"{used_model} (묶음 {len(packed_ids)}건)"
+                results[i] = entry
+            else:
+                # 응답에서 빠졌거나 형식이 잘못된 문서만 단건 분석으로 다시 처리 (요청 간격 유지)
+                time.sleep(REQUEST_INTERVAL)
+                results[i] = self.parse_with_llm(source)
+        return results
+
+    @staticmethod
+    def _is_valid_result(entry):
+        """묶음 분석 결과 중 한 문서의 결과가 사용할 수 있는 형식인지 확인합니다."""
+        if not isinstance(entry, dict):
+            return False
+        items = entry.get("items", [])
+        if not isinstance(items, list):
+            return False
+        return bool(entry.get("client_name") or entry.get("order_date") or items)
+
+    def _generate_json(self, inputs):
+        """
+        모델을 호출하여 JSON 응답을 받습니다. (모델 교체/재시도 포함)
+        반환값: (파싱된 JSON 또는 None, 마지막으로 사용한 모델명, 마지막 에러, JSON 해석 실패 여부)
+        - JSON 해석 실패: 모델 응답은 받았으나 JSON이 아님 (요청 실패/할당량 초과와 구분)
+        """
         # 3. 모델 설정 (The "No Number" Strategy)
         # 제미나이 정밀 분석 결과: 서버 목록에 '1.5' 숫자가 없는 'gemini-flash-latest'가 존재함.
         # 따라서 이 정확한 이름을 최우선으로 사용하여 404 에러를 방지합니다.
@@ -79,11 +271,11 @@ class PRExtractor:
                 elif text.startswith("```"):
                     text = text.replace("```", "")
                 
-                result_json = json.loads(text)
-                
-                # 성공 시 사용된 모델명 기록
-                result_json['_used_model'] = current_model_name
-                return result_json
+                try:
+                    return json.loads(text), current_model_name, None, False
+                except ValueError as parse_e:
+                    # 응답은 정상 수신: 같은 요청을 반복하지 않고 호출한 쪽에서 처리
+                    return None, current_model_name, f"{current_model_name}: JSON 해석 실패 ({parse_e})", True
                 
             except Exception as inner_e:
                 err_msg = str(inner_e).lower()
@@ -115,12 +307,4 @@ class PRExtractor:
                 
                 break
         
-        # 실패 시 에러 리턴
-        return {"error": f"분석 실패 ({current_model_name}). (Last Error: {last_error})"}
-        
-        # 디버깅 정보 (실패 시)
-        debug_info = f"\n[최종 선택 시도한 모델]: {target_model_name}"
-        return {"error": f"분석 실패. {debug_info}\n(Last Error: {last_error})"}
-
-
-
+        return None, current_model_name, last_error, False
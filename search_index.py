@@ -0,0 +1,173 @@
+import sqlite3
+import os
+import pandas as pd
+
+# 검색 인덱스 파일 경로 (SQLite FTS5, trigram 토크나이저 사용)
+# trigram 토크나이저는 띄어쓰기와 무관하게 부분 문자열을 찾으므로 한글 검색에 적합함
+# trigram으로 찾을 수 없는 1~2글자 검색어(예: 두 글자 거래처/품목명)는 2글자 조각(bigram) 테이블로 찾음
+INDEX_FILE = "po_search.db"
+
+# bigram 테이블에서 필드 끝을 표시하는 문자 (한 글자 검색어도 bigram 앞글자로 찾을 수 있도록)
+_END_MARK = "\x1f"
+
+# 검색 대상 컬럼
+SEARCH_COLS = ['거래처명', '수화주', '품목명(규격)', '주소지', '비고']
+
+# 검색 결과에 함께 보여줄 컬럼 (검색 대상은 아님)
+EXTRA_COLS = ['일자', '수량', '파일명']
+
+# SQLite 컬럼명 (한글/괄호 컬럼명을 그대로 쓰지 않기 위함)
+_FIELD_NAMES = ['client', 'consignee', 'item', 'address', 'remarks', 'order_date', 'qty', 'filename']
+_ALL_COLS = SEARCH_COLS + EXTRA_COLS
+
+
+def _connect():
+    conn = sqlite3.connect(INDEX_FILE)
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS po_search USING fts5(
+            {', '.join(_FIELD_NAMES[:len(SEARCH_COLS)])},
+            {', '.join(f'{name} UNINDEXED' for name in _FIELD_NAMES[len(SEARCH_COLS):])},
+            tokenize='trigram'
+        )
+        """
+    )
+    has_bigrams = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'po_bigrams'").fetchone()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS po_bigrams ("
+        "gram TEXT, doc INTEGER, PRIMARY KEY (gram, doc)) WITHOUT ROWID"
+    )
+    if not has_bigrams:
+        # bigram 테이블 도입 이전에 만들어진 인덱스: 기존 행으로 채움
+        with conn:
+            rows = conn.execute(
+                f"SELECT rowid, {', '.join(_FIELD_NAMES[:len(SEARCH_COLS)])} FROM po_search"
+            ).fetchall()
+            conn.executemany(
+                "INSERT OR IGNORE INTO po_bigrams VALUES (?, ?)",
+                ((gram, row[0]) for row in rows for gram in _bigrams(row[1:]))
+            )
+    return conn
+
+
+def _to_records(df):
+    """DataFrame을 인덱스에 넣을 튜플 목록으로 변환합니다."""
+    values = pd.DataFrame(index=df.index)
+    for col in _ALL_COLS:
+        if col in df.columns:
+            values[col] = df[col].fillna("").astype(str)
+        else:
+            values[col] = ""
+    return list(values[_ALL_COLS].itertuples(index=False, name=None))
+
+
+def _bigrams(record):
+    """검색 대상 필드들의 2글자 조각 집합 (소문자, 필드 끝 표시 포함)"""
+    grams = set()
+    for text in record[:len(SEARCH_COLS)]:
+        text = text.lower() + _END_MARK
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def add_rows(df):
+    """
+    새로 저장된 행들을 검색 인덱스에 추가합니다.
+    """
+    if df.empty:
+        return
+    records = _to_records(df)
+    conn = _connect()
+    try:
+        with conn:
+            # rowid를 직접 지정하여 bigram 테이블과 연결
+            start = conn.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM po_search").fetchone()[0]
+            conn.executemany(
+                f"INSERT INTO po_search (rowid, {', '.join(_FIELD_NAMES)}) VALUES ({', '.join('?' * (len(_FIELD_NAMES) + 1))})",
+                [(start + i,) + record for i, record in enumerate(records)]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO po_bigrams VALUES (?, ?)",
+                ((gram, start + i) for i, record in enumerate(records) for gram in _bigrams(record))
+            )
+    finally:
+        conn.close()
+
+
+def rebuild_index(df):
+    """
+    전체 데이터로 검색 인덱스를 다시 만듭니다. (데이터가 없어도 빈 인덱스 파일을 생성)
+    """
+    clear_index()
+    _connect().close()
+    add_rows(df)
+
+
+def index_exists():
+    return os.path.exists(INDEX_FILE)
+
+
+def clear_index():
+    """
+    검색 인덱스를 삭제합니다.
+    """
+    if os.path.exists(INDEX_FILE):
+        os.remove(INDEX_FILE)
+
+
+def _quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def search(query, limit=200):
+    """
+    거래처명/수화주/품목명/주소지/비고에서 검색어를 찾습니다.
+    1) 3글자 이상: FTS5 trigram 인덱스로 부분 일치 검색
+    2) 결과가 없으면: 검색어의 3글자 조각 중 일부만 일치해도 찾는 유사 검색 (오타 허용)
+    3) 2글자 이하: bigram 테이블에서 해당 조각(1글자는 그 글자로 시작하는 조각)을 가진 행 조회
+    반환값: (결과 DataFrame, 유사 검색 여부)
+    """
+    query = (query or "").strip()
+    columns = ", ".join(_FIELD_NAMES)
+    empty = pd.DataFrame(columns=_ALL_COLS)
+    if not query or not os.path.exists(INDEX_FILE):
+        return empty, False
+
+    conn = None
+    try:
+        conn = _connect()
+        fuzzy = False
+        if len(query) == 2:
+            rows = conn.execute(
+                f"SELECT {columns} FROM po_search WHERE rowid IN "
+                "(SELECT doc FROM po_bigrams WHERE gram = ? LIMIT ?)",
+                (query.lower(), limit)
+            ).fetchall()
+        elif len(query) == 1:
+            rows = conn.execute(
+                f"SELECT {columns} FROM po_search WHERE rowid IN "
+                "(SELECT doc FROM po_bigrams WHERE gram >= ? AND gram < ? LIMIT ?)",
+                (query.lower(), query.lower() + "\U0010ffff", limit * 10)
+            ).fetchall()[:limit]
+        else:
+            rows = conn.execute(
+                f"SELECT {columns} FROM po_search WHERE po_search MATCH ? ORDER BY rank LIMIT ?",
+                (_quote(query), limit)
+            ).fetchall()
+            if not rows:
+                # 유사 검색: trigram 조각을 OR로 묶고 bm25 순위로 정렬
+                grams = {query[i:i + 3] for i in range(len(query) - 2)}
+                if len(grams) > 1:
+                    fuzzy = True
+                    rows = conn.execute(
+                        f"SELECT {columns} FROM po_search WHERE po_search MATCH ? ORDER BY rank LIMIT ?",
+                        (" OR ".join(_quote(g) for g in sorted(grams)), limit)
+                    ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Search Error: {e}")
+        return empty, False
+    finally:
+        if conn is not None:
+            conn.close()
+
+    return pd.DataFrame(rows, columns=_ALL_COLS), fuzzy